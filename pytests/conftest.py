@@ -26,27 +26,29 @@ def pytest_generate_tests(metafunc):
         path_to_snippets = "snippets"
         inkscape_versions = glob.glob(os.path.join(path_to_snippets, "inkscape-*.*"))
 
+        specific_tests = frozenset(SPECIFIC_TESTS)
+        required_files = {"config.json", "original.svg", "modified.svg"}
+
         args = []
         ids = []
         for inkscape_version in inkscape_versions:
+            inkscape_basename = os.path.basename(inkscape_version)
             for folder, _, files in os.walk(inkscape_version):
                 test_case = os.path.basename(folder)
-                if len(SPECIFIC_TESTS) == 0 or test_case in SPECIFIC_TESTS:
-                    if "config.json" in files and \
-                            "original.svg" in files and \
-                            "modified.svg" in files:
+                if not specific_tests or test_case in specific_tests:
+                    if required_files.issubset(files):
                         textext_version = os.path.dirname(os.path.dirname(folder))
                         converter = os.path.dirname(folder)
-                        args.append([path_to_snippets,
-                                     os.path.basename(inkscape_version),
+                        args.append((path_to_snippets,
+                                     inkscape_basename,
                                      os.path.basename(textext_version),
                                      os.path.basename(converter),
                                      test_case
-                                     ])
+                                     ))
                         ids.append(os.path.relpath(folder, path_to_snippets))
 
         assert (len(ids) > 0), "No valid test case(s) defined"
 
-        args_with_ids = sorted(list(zip(args,ids)))
+        args_with_ids = sorted(zip(args, ids))
         args, ids = zip(*args_with_ids)
         metafunc.parametrize(["root", "inkscape_version", "textext_version", "converter", "test_case"], args, ids=ids)
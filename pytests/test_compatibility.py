@@ -16,16 +16,15 @@ import tempfile
 import subprocess
 import shutil
 import json
+import numpy
 import PIL.Image
 
 if os.name == "nt":
     EXTENSION_DIR = os.path.join(os.getenv("APPDATA"), "inkscape\\extensions\\textext")
     INKSCAPE_EXE = "C:\\Program Files\\Inkscape\\bin\\inkscape.com"
-    COMPARE_EXE = ["C:\\Program Files\\ImageMagick-7.0.10-Q8\\magick", "compare"]
 else:
     EXTENSION_DIR = os.path.expanduser("~/.config/inkscape/extensions/textext")
     INKSCAPE_EXE = "inkscape"
-    COMPARE_EXE = ["compare"]
 
 # Set this to False to keep results in separate pytests_results folder
 RESULTS_INTO_TEMPDIR = True
@@ -119,36 +118,45 @@ def images_are_same(png1, png2, fuzz="0%", size_abs_tol=10, size_rel_tol=0.005,
         w //= 2
         h //= 2
         sys.stderr.write("Images are downsampled to (%d, %d)\n" % (w, h))
+        im1 = im1.resize((w, h), PIL.Image.LANCZOS)
+        im2 = im2.resize((w, h), PIL.Image.LANCZOS)
 
-    im1.resize((w, h), PIL.Image.LANCZOS).save(png1)
-    im2.resize((w, h), PIL.Image.LANCZOS).save(png2)
+    diff_mask = different_pixels(im1, im2, fuzz)
+    if not RESULTS_INTO_TEMPDIR:
+        PIL.Image.fromarray(diff_mask).save(os.path.join(os.path.dirname(png1), "diff.png"))
+    diff_pixels = int(numpy.count_nonzero(diff_mask))
 
-    proc = subprocess.Popen(COMPARE_EXE + ["-channel", "rgba", "-metric", "ae",
-                                           "-fuzz", fuzz, png1, png2,
-                                           os.devnull if RESULTS_INTO_TEMPDIR else
-                                           os.path.join(os.path.dirname(png1), "diff.png")],
-                            stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+    if diff_pixels > pixel_diff_abs_tol:
+        return False, "diff pixels (%d) > %d" % (diff_pixels, pixel_diff_abs_tol)
 
-    stdout, stderr = proc.communicate()
+    if diff_pixels > w * h * pixel_diff_rel_tol:
+        return False, "diff pixels (%d) > W*H*%f (%f)" % (
+            diff_pixels, pixel_diff_rel_tol, w * h * pixel_diff_rel_tol)
 
-    if proc.returncode in [0, 1]:
-        try:
-            diff_pixels = int(stderr.decode("utf-8"))
-        except (ValueError, AttributeError):
-            return False, "Can't parse `compare` output"
+    return True, "diff pixels (%d)" % diff_pixels
 
-        if diff_pixels > pixel_diff_abs_tol:
-            return False, "diff pixels (%d) > %d" % (diff_pixels, pixel_diff_abs_tol)
 
-        if diff_pixels > w * h * pixel_diff_rel_tol:
-            return False, "diff pixels (%d) > W*H*%f (%f)" % (
-                diff_pixels, pixel_diff_rel_tol, w * h * pixel_diff_rel_tol)
+def different_pixels(im1, im2, fuzz="0%"):
+    """
+    Finds the pixels which differ like ImageMagick's `compare -channel rgba -metric ae -fuzz <fuzz>`
+    does: The color channels are weighted by alpha and a pixel differs if the euclidean
+    distance of its channels exceeds the fuzz.
+
+    :param (PIL.Image) im1: first image
+    :param (PIL.Image) im2: second image, same size as the first one
+    :param (str) fuzz: colors within this distance are considered equal, in percent (e.g. "5%")
+    :return (numpy.ndarray): boolean mask of the different pixels
+    """
+    assert fuzz.endswith("%")
+    threshold = float(fuzz[:-1]) / 100
 
-        return True, "diff pixels (%d)" % diff_pixels
-    else:
-        if stdout: sys.stdout.write(stdout)
-        if stderr: sys.stderr.write(stderr)
-        return False, "`compare` return code is %d " % proc.returncode
+    a = numpy.asarray(im1.convert("RGBA"), dtype=numpy.float64) / 255
+    b = numpy.asarray(im2.convert("RGBA"), dtype=numpy.float64) / 255
+
+    diff = a - b
+    diff[..., :3] = a[..., :3] * a[..., 3:] - b[..., :3] * b[..., 3:]
+
+    return (diff * diff).sum(axis=-1) > threshold * threshold
 
 
 def is_current_version_compatible(test_id,
@@ -182,7 +190,8 @@ def is_current_version_compatible(test_id,
         png1 = os.path.join(tmp_dir, "1.png")
         png2 = os.path.join(tmp_dir, "2.png")
 
-        config = json.load(open(json_config, encoding="utf-8"))
+        with open(json_config, encoding="utf-8") as f:
+            config = json.load(f)
         check_render = config["check"]["render"]
 
         render_options = {}
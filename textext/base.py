@@ -657,8 +657,7 @@ class TexToPdfConverter:
             parser = LatexLogParser()
 
             try:
-                with open(self.tmp('log'), encoding='utf8') as f:
-                    parser.process(f)
+                parser.process_file(self.tmp('log'))
                 return parser.errors[0]
             except Exception as ignored:
                 return "TeX compilation failed. See stdout output for more details"
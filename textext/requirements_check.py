@@ -12,9 +12,12 @@ Classes for handling and checking of the dependencies required
 to successfully run TexText.
 """
 import abc
+import concurrent.futures
+import functools
 import logging
 import os
 import re
+import stat
 import subprocess
 import sys
 
@@ -32,6 +35,7 @@ class Defaults(object):
     @abc.abstractproperty
     def executable_names(self): pass
 
+    # The paths below are implemented as functools.cached_property, the environment is queried only once
     @abc.abstractproperty
     def inkscape_user_extensions_path(self): pass
 
@@ -60,7 +64,7 @@ class Defaults(object):
 
     @staticmethod
     @abc.abstractmethod
-    def call_command(command, return_code=0): pass
+    def call_command(command, return_code=0, timeout=None, capture_stdout=True, capture_stderr=True): pass
 
 
 class LinuxDefaults(Defaults):
@@ -73,28 +77,40 @@ class LinuxDefaults(Defaults):
                         "typst": ["typst"]
                         }
 
-    @property
+    @functools.cached_property
     def inkscape_user_extensions_path(self):
         return os.path.expanduser("~/.config/inkscape/extensions")
 
-    @property
+    @functools.cached_property
     def textext_config_path(self):
         return os.path.expanduser("~/.config/textext")
 
-    @property
+    @functools.cached_property
     def textext_logfile_path(self):
         return os.path.expanduser("~/.cache/textext")
 
+    # PATH and the directories it was split into, see get_system_path
+    _split_path = (None, [])
+
     def get_system_path(self):
-        return os.environ["PATH"].split(os.path.pathsep)
+        # PATH is split again only if it has changed, duplicate directories are dropped
+        path = os.environ["PATH"]
+        if self._split_path[0] != path:
+            self._split_path = (path, list(dict.fromkeys(path.split(os.path.pathsep))))
+        return self._split_path[1]
 
     @staticmethod
-    def call_command(command, return_code=0):
-        p = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = p.communicate()
+    def call_command(command, return_code=0, timeout=None, capture_stdout=True, capture_stderr=True):
+        # Output which is not needed by the caller goes to /dev/null instead of a pipe.
+        # Our file descriptors are non-inheritable anyway (PEP 446), close_fds=False lets
+        # subprocess use posix_spawn and skip the descriptor closing loop in the child.
+        p = subprocess.run(command,
+                           stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL,
+                           stderr=subprocess.PIPE if capture_stderr else subprocess.DEVNULL,
+                           close_fds=False, timeout=timeout)
         if return_code is not None and p.returncode != return_code:
             raise subprocess.CalledProcessError(p.returncode,command)
-        return stdout, stderr
+        return p.stdout, p.stderr
 
 
 class MacDefaults(LinuxDefaults):
@@ -108,18 +124,18 @@ class MacDefaults(LinuxDefaults):
 
     def get_system_path(self):
         path = ["/Applications/Inkscape.app/Contents/Resources"]
-        path += os.environ["PATH"].split(os.path.pathsep)
+        path += super(MacDefaults, self).get_system_path()
         return path
 
-    @property
+    @functools.cached_property
     def inkscape_user_extensions_path(self):
         return os.path.expanduser("~/Library/Application Support/org.inkscape.Inkscape/config/inkscape/extensions")
 
-    @property
+    @functools.cached_property
     def textext_config_path(self):
         return os.path.expanduser("~/Library/Preferences/textext")
 
-    @property
+    @functools.cached_property
     def textext_logfile_path(self):
         return os.path.expanduser("~/Library/Preferences/textext")
 
@@ -138,7 +154,10 @@ class WindowsDefaults(Defaults):
     def __init__(self):
         super(WindowsDefaults, self)
         from .win_app_paths import get_non_syspath_dirs
-        self._tweaked_syspath = get_non_syspath_dirs() + os.environ["PATH"].split(os.path.pathsep)
+        # The Inkscape bin directory is often in PATH as well and PATH itself may list
+        # directories more than once, so duplicate directories are dropped
+        self._tweaked_syspath = list(dict.fromkeys(get_non_syspath_dirs() +
+                                                   os.environ["PATH"].split(os.path.pathsep)))
 
         # Windows 10 supports colored output since anniversary update (build 14393)
         # so we try to use it (it has to be enabled since it is always disabled by default!)
@@ -161,15 +180,15 @@ class WindowsDefaults(Defaults):
         except (ImportError, AttributeError):
             pass
 
-    @property
+    @functools.cached_property
     def inkscape_user_extensions_path(self):
         return os.path.join(os.getenv("APPDATA"), "inkscape", "extensions")
 
-    @property
+    @functools.cached_property
     def textext_config_path(self):
         return os.path.join(os.getenv("APPDATA"), "textext")
 
-    @property
+    @functools.cached_property
     def textext_logfile_path(self):
         return os.path.join(os.getenv("APPDATA"), "textext")
 
@@ -177,17 +196,20 @@ class WindowsDefaults(Defaults):
         return self._tweaked_syspath
 
     @staticmethod
-    def call_command(command, return_code=0): # type: (List,Optional[int]) -> Tuple[str, str]
+    def call_command(command, return_code=0, timeout=None, capture_stdout=True, capture_stderr=True):
+        # type: (List,Optional[int],Optional[float],bool,bool) -> Tuple[str, str]
         # Ensure that command window does not pop up on Windows!
         info = subprocess.STARTUPINFO()
         info.dwFlags |= subprocess.STARTF_USESHOWWINDOW
         info.wShowWindow = subprocess.SW_HIDE
-        p = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=info)
-        stdout, stderr = p.communicate()
+        p = subprocess.run(command,
+                           stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL,
+                           stderr=subprocess.PIPE if capture_stderr else subprocess.DEVNULL,
+                           startupinfo=info, timeout=timeout)
         if return_code is not None and p.returncode != return_code:
-            raise subprocess.CalledProcessError(p.returncode, "{0}, stderr: {1}".format(command, stderr),
-                                                output=stdout, stderr=stderr)
-        return stdout, stderr
+            raise subprocess.CalledProcessError(p.returncode, "{0}, stderr: {1}".format(command, p.stderr),
+                                                output=p.stdout, stderr=p.stderr)
+        return p.stdout, p.stderr
 
 
 
@@ -233,7 +255,29 @@ class LoggingColors(object):
 
     UNDERLINED = "\033[4m"
 
+    # Colors of VERBOSE, DEBUG, INFO, WARNING, ERROR, SUCCESS, UNKNOWN and CRITICAL
+    LEVEL_COLORS = (
+        COLOR_RESET,
+        COLOR_RESET,
+        BG_DEFAULT + FG_LIGHT_BLUE,
+        BG_YELLOW + FG_WHITE,
+        BG_DEFAULT + FG_RED,
+        BG_DEFAULT + FG_GREEN,
+        BG_DEFAULT + FG_YELLOW,
+        BG_RED + FG_WHITE,
+    )
+    NO_LEVEL_COLORS = ("",) * len(LEVEL_COLORS)
+
+    def __init__(self):
+        self._cache = {}
+
     def __call__(self):
+        enable_colors = LoggingColors.enable_colors
+        if enable_colors not in self._cache:
+            self._cache[enable_colors] = self._build_levels_colors(enable_colors)
+        return self._cache[enable_colors]
+
+    def _build_levels_colors(self, enable_colors):
         levels = [
             VERBOSE,  # 5
             logging.DEBUG,  # 10
@@ -254,53 +298,71 @@ class LoggingColors(object):
             "UNKNOWN ",
             "CRITICAL"
         ]
-        colors = [
-            self.COLOR_RESET,
-            self.COLOR_RESET,
-            self.BG_DEFAULT + self.FG_LIGHT_BLUE,
-            self.BG_YELLOW + self.FG_WHITE,
-            self.BG_DEFAULT + self.FG_RED,
-            self.BG_DEFAULT + self.FG_GREEN,
-            self.BG_DEFAULT + self.FG_YELLOW,
-            self.BG_RED + self.FG_WHITE,
-        ]
-        if not LoggingColors.enable_colors:
-            colors = [""] * len(colors)
-            self.COLOR_RESET = ""
-        return {name: (level, color) for level, name, color in zip(levels, names, colors)}, self.COLOR_RESET
+        if enable_colors:
+            colors, color_reset = self.LEVEL_COLORS, self.COLOR_RESET
+        else:
+            colors, color_reset = self.NO_LEVEL_COLORS, ""
+        return {name: (level, color) for level, name, color in zip(levels, names, colors)}, color_reset
+
+
+# Colors of the requirement check results, updated by set_logging_levels()
+_COLOR_TRUE = ""
+_COLOR_FALSE = ""
+_COLOR_UNKNOWN = ""
 
 
 def set_logging_levels():
+    global _COLOR_TRUE, _COLOR_FALSE, _COLOR_UNKNOWN
     level_colors, COLOR_RESET = get_levels_colors()
     for name, (level, color) in level_colors.items():
         logging.addLevelName(level, color + name + COLOR_RESET)
+    _COLOR_TRUE = level_colors["SUCCESS "][1]
+    _COLOR_FALSE = level_colors["ERROR   "][1]
+    _COLOR_UNKNOWN = level_colors["UNKNOWN "][1]
 
 
 class TrinaryLogicValue(object):
-    def __init__(self, value=None):
+    _interned = {}
+
+    def __new__(cls, value=None):
+        # True, False and None are shared instances, so combining results does not allocate
         if isinstance(value, TrinaryLogicValue):
-            self.value = value.value
+            value = value.value
+        if value is not None and not isinstance(value, bool):
+            return cls._create(value)
+        instance = cls._interned.get(value)
+        if instance is None:
+            instance = cls._interned[value] = cls._create(value)
+        return instance
+
+    @classmethod
+    def _create(cls, value):
+        instance = super(TrinaryLogicValue, cls).__new__(cls)
+        instance.value = value
+        if value is None:
+            instance._index = 1
         else:
-            self.value = value
+            instance._index = 2 if value else 0
+        return instance
+
+    def __reduce__(self):
+        # Unpickling goes through __new__ and gets the shared instance back
+        return TrinaryLogicValue, (self.value,)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __and__(self, rhs):
-        if rhs.value == False or self.value == False:
-            return TrinaryLogicValue(False)
-        if rhs.value is None or self.value is None:
-            return TrinaryLogicValue(None)
-        return TrinaryLogicValue(True)
+        return _TRINARY_VALUES[_TRINARY_AND[self._index][rhs._index]]
 
     def __or__(self, rhs):
-        if rhs.value == True or self.value == True:
-            return TrinaryLogicValue(True)
-        if rhs.value is None or self.value is None:
-            return TrinaryLogicValue(None)
-        return TrinaryLogicValue(False)
+        return _TRINARY_VALUES[_TRINARY_OR[self._index][rhs._index]]
 
     def __invert__(self):
-        if self.value is None:
-            return TrinaryLogicValue(None)
-        return TrinaryLogicValue(not self.value)
+        return _TRINARY_VALUES[_TRINARY_NOT[self._index]]
 
     def __eq__(self, rhs):
         if isinstance(rhs, TrinaryLogicValue):
@@ -314,6 +376,24 @@ class TrinaryLogicValue(object):
         return "TrinaryLogicValue(%s)" % self.value
 
 
+_TRINARY_TRUE = TrinaryLogicValue(True)
+_TRINARY_FALSE = TrinaryLogicValue(False)
+_TRINARY_UNKNOWN = TrinaryLogicValue(None)
+
+# Truth tables of the trinary logic, states are indexed as False=0, None=1, True=2
+_TRINARY_VALUES = (_TRINARY_FALSE, _TRINARY_UNKNOWN, _TRINARY_TRUE)
+_TRINARY_AND = ((0, 0, 0),
+                (0, 1, 1),
+                (0, 1, 2))
+_TRINARY_OR = ((0, 1, 2),
+               (1, 1, 2),
+               (2, 2, 2))
+_TRINARY_NOT = (2, 1, 0)
+
+# Short representation of the values in the printed result tree, indexed like the truth tables
+_VALUE_REPR = ("Fail", "Ukwn", "Succ")
+
+
 class RequirementCheckResult(object):
     def __init__(self, value, messages, nested=None, is_and_node=False, is_or_node=False, is_not_node=False, **kwargs):
         self.value = TrinaryLogicValue(value)
@@ -328,191 +408,246 @@ class RequirementCheckResult(object):
 
     @property
     def color(self):
-        if self.value == True:
-            return get_levels_colors()[0]["SUCCESS "][1]
-        elif self.value == False:
-            return get_levels_colors()[0]["ERROR   "][1]
-        else:
-            return get_levels_colors()[0]["UNKNOWN "][1]
-
-    def print_to_logger(self, logger, offset=0, prefix="", parent=None):
+        return (_COLOR_FALSE, _COLOR_UNKNOWN, _COLOR_TRUE)[self.value._index]
+
+    def print_to_logger(self, logger, offset=0, prefix="", parent=None, non_critical_value=None):
+        """
+        Prints the result tree to the logger. If `non_critical_value` is given, critical errors are
+        marked on the fly as done by mark_critical_errors(), saving a separate pass over the tree.
+        """
+        # Everything which does not depend on the node is resolved once for the whole tree,
+        # the per value tuples are indexed like the truth tables of TrinaryLogicValue
         _, reset_color = get_levels_colors()
-
+        value_colors = (_COLOR_FALSE, _COLOR_UNKNOWN, _COLOR_TRUE)
+        value_levels = (logging.INFO, UNKNOWN, SUCCESS)
+
+        # Collect the lines of the whole tree, then hand them to the logger in one batch,
+        # skipping levels the logger does not emit
+        lines = []
+        self._collect_lines(lines, reset_color, value_colors, value_levels, prefix, parent, non_critical_value)
+        enabled = {}
+        for lvl, line in lines:
+            if lvl not in enabled:
+                enabled[lvl] = logger.isEnabledFor(lvl)
+            if enabled[lvl]:
+                logger.log(lvl, line)
+
+    def _collect_lines(self, lines, reset_color, value_colors, value_levels, prefix, parent, non_critical_value):
+        nested_non_critical_value = self._mark_critical(non_critical_value)
+
+        index = self.value._index
         if self.is_critical:
             lvl = logging.CRITICAL
-        elif self.value == True:
-            lvl = SUCCESS
-        elif self.value == False:
-            lvl = logging.INFO
         else:
-            lvl = UNKNOWN
+            lvl = value_levels[index]
 
-        value_repr = {
-            True: "Succ",
-            False: "Fail",
-            None: "Ukwn"
-        }
         if self.nested:
-            nest_symbol = "+ [%s]" % value_repr[self.value.value]
+            nest_symbol = "+ [%s]" % _VALUE_REPR[index]
         else:
-            nest_symbol = "* [%s]" % value_repr[self.value.value]
+            nest_symbol = "* [%s]" % _VALUE_REPR[index]
 
+        color = value_colors[index]
         if parent:
+            parent_color = value_colors[parent.value._index]
             if parent.is_and_node:
-                tail = parent.color + "/-and-" + self.color + nest_symbol + reset_color
+                tail = parent_color + "/-and-" + color + nest_symbol + reset_color
             elif parent.is_or_node:
-                tail = parent.color + "/--or-" + self.color + nest_symbol + reset_color
+                tail = parent_color + "/--or-" + color + nest_symbol + reset_color
             elif parent.is_not_node:
-                tail = parent.color + "/-not-" + self.color + nest_symbol + reset_color
+                tail = parent_color + "/-not-" + color + nest_symbol + reset_color
             else:
-                tail = parent.color + "/-----" + self.color + nest_symbol + reset_color
+                tail = parent_color + "/-----" + color + nest_symbol + reset_color
         else:
-            tail = self.color + nest_symbol + reset_color
+            tail = color + nest_symbol + reset_color
 
         if not parent:
             suffix = ""
         elif parent.nested[-1] is self:
             suffix = "      "
         else:
-            suffix = parent.color + "|" + reset_color + "     "
+            suffix = parent_color + "|" + reset_color + "     "
 
         if not self.messages:
             messages = [""]
         else:
             messages = self.messages
         for msg in messages:
-            line = ""
-            line += prefix + tail
-            line += " " + msg
-
-            logger.log(lvl, line)
+            lines.append((lvl, "".join([prefix, tail, " ", msg])))
 
             tail = suffix
         for nst in self.nested:
-            nst.print_to_logger(logger, offset + 1, prefix=prefix + suffix, parent=self)
+            nst._collect_lines(lines, reset_color, value_colors, value_levels, prefix + suffix, self,
+                               nested_non_critical_value)
 
     def flatten(self):
+        # Post-order walk with an explicit stack: once all children of a node are flattened,
+        # the children themselves are merged with their own same-kind children
+        stack = [(self, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if children_done:
+                for i, nst in enumerate(node.nested):
+                    node.nested[i] = nst.merge_nested()
+            elif node.nested:
+                stack.append((node, True))
+                stack.extend((nst, False) for nst in node.nested)
+
+        return self.merge_nested()
+
+    def merge_nested(self):
+        """
+        Merges a directly nested and/or node of the same kind into this node. The
+        nested nodes are expected to be merged already.
+        """
         if len(self.nested) == 0:
             return self
 
-        for i, nst in enumerate(self.nested):
-            self.nested[i] = nst.flatten()
-
-        if self.nested[0].is_or_node and self.is_or_node:
-            kwargs = dict(self.kwargs)
-            kwargs.update(self.nested[0].kwargs)
-            return RequirementCheckResult(
-                self.value,
-                self.nested[0].messages + self.messages,
-                self.nested[0].nested + self.nested[1:],
-                is_or_node=True,
-                **kwargs
-            )
-
-        if self.nested[0].is_and_node and self.is_and_node:
-            kwargs = dict(self.kwargs)
-            kwargs.update(self.nested[0].kwargs)
-            return RequirementCheckResult(
-                self.value,
-                self.nested[0].messages + self.messages,
-                self.nested[0].nested + self.nested[1:],
-                is_and_node=True,
-                **kwargs
-            )
-
-        if self.nested[-1].is_or_node and self.is_or_node:
-            kwargs = dict(self.kwargs)
-            kwargs.update(self.nested[-1].kwargs)
-            return RequirementCheckResult(
-                self.value,
-                self.messages + self.nested[-1].messages,
-                self.nested[:-1] + self.nested[-1].nested,
-                is_or_node=True,
-                **kwargs
-            )
-
-        if self.nested[-1].is_and_node and self.is_and_node:
-            kwargs = dict(self.kwargs)
-            kwargs.update(self.nested[-1].kwargs)
-            return RequirementCheckResult(
-                self.value,
-                self.messages + self.nested[-1].messages,
-                self.nested[:-1] + self.nested[-1].nested,
-                is_and_node=True,
-                **kwargs
-            )
-
-        if self.nested[-1].is_not_node:
-            self.kwargs.update(self.nested[-1].kwargs)
+        if self._is_same_kind(self.nested[0]):
+            nst = self.nested[0]
+            messages = list(nst.messages)
+            messages.extend(self.messages)
+            self.nested[:1] = nst.nested
+        elif self._is_same_kind(self.nested[-1]):
+            nst = self.nested[-1]
+            messages = list(self.messages)
+            messages.extend(nst.messages)
+            self.nested[-1:] = nst.nested
+        else:
+            if self.nested[-1].is_not_node:
+                self.kwargs.update(self.nested[-1].kwargs)
+            return self
 
+        self.messages = messages
+        self.kwargs.update(nst.kwargs)
         return self
 
+    def _is_same_kind(self, other):
+        return self.is_or_node and other.is_or_node or self.is_and_node and other.is_and_node
+
     def mark_critical_errors(self, non_critical_value=True):
-        if self.value == non_critical_value:
-            return
-        if self.value == None:
-            return
+        nested_non_critical_value = self._mark_critical(non_critical_value)
+        if nested_non_critical_value is not None:
+            for nst in self.nested:
+                nst.mark_critical_errors(nested_non_critical_value)
+
+    def _mark_critical(self, non_critical_value):
+        """
+        Marks this node as critical if its value differs from `non_critical_value` and returns
+        the non critical value for the nested nodes (None if they are not to be marked)
+        """
+        value = self.value.value
+        if non_critical_value is None or value is None or value == non_critical_value:
+            return None
 
         self.is_critical = True
 
         if self.is_and_node or self.is_or_node:
-            for nst in self.nested:
-                if nst.value != non_critical_value:
-                    nst.mark_critical_errors(non_critical_value)
+            return non_critical_value
 
         if self.is_not_node:
-            for nst in self.nested:
-                nst.mark_critical_errors(not non_critical_value)
+            return not non_critical_value
+
+        return None
 
     def __getitem__(self, item):
         return self.kwargs[item]
 
 
 class Requirement(object):
+    """
+    A requirement is either a leaf which evaluates a criteria function or an and/or/not
+    node combining other requirements via the `&`, `|` and `~` operators.
+    """
+    AND = "and"
+    OR = "or"
+    NOT = "not"
+
+    # Slots of the prepended/ appended messages per result type and per result value
+    MESSAGE_SLOTS = {"ANY": 0, "SUCCESS": 1, "ERROR": 2, "UNKNOWN": 3}
+    STATUS_SLOTS = {True: 1, False: 2, None: 3}
+
     def __init__(self, criteria, *args, **kwargs):
-        self.criteria = lambda: criteria(*args, **kwargs)
-        self._prepended_messages = {"ANY": [], "SUCCESS": [], "ERROR": [], "UNKNOWN": []}
-        self._appended_messages = {"ANY": [], "SUCCESS": [], "ERROR": [], "UNKNOWN": []}
+        self.criteria = criteria
+        self._args = args
+        self._kwargs = kwargs
+        self.kind = None
+        self.children = ()
+        self._prepended_messages = ([], [], [], [])
+        self._appended_messages = ([], [], [], [])
         self._overwrite_messages = None
 
         self._on_unknown_callbacks = []
         self._on_success_callbacks = []
         self._on_failure_callbacks = []
 
+    @classmethod
+    def combine(cls, kind, *children):
+        # type: (str, Requirement) -> Requirement
+        requirement = cls(None)
+        requirement.kind = kind
+        requirement.children = children
+        return requirement
+
     def check(self):
-        result = self.criteria()
-        if not isinstance(result.messages,list):
-            result.messages = [result.messages]
+        # Post-order walk over the requirement tree using an explicit stack. Each
+        # stack entry holds a requirement and the results of its children checked so far.
+        stack = [(self, [])]
+        while True:
+            requirement, nested = stack[-1]
+            if len(nested) < len(requirement.children):
+                stack.append((requirement.children[len(nested)], []))
+                continue
+
+            stack.pop()
+            if requirement.kind is None:
+                result = requirement._process_result(requirement.criteria(*requirement._args,
+                                                                          **requirement._kwargs))
+            else:
+                result = requirement._process_result(requirement._combine_results(nested)).merge_nested()
+
+            if not stack:
+                return result
+            stack[-1][1].append(result)
+
+    def _combine_results(self, nested):
+        if self.kind == Requirement.AND:
+            return RequirementCheckResult(nested[0].value & nested[1].value, [], nested, is_and_node=True)
+        if self.kind == Requirement.OR:
+            return RequirementCheckResult(nested[0].value | nested[1].value, [], nested, is_or_node=True)
+        return RequirementCheckResult(~nested[0].value, [], nested, is_not_node=True)
+
+    def _process_result(self, result):
+        messages = result.messages
+        if not isinstance(messages, list):
+            messages = [messages]
         if self._overwrite_messages:
-            result.messages = self._overwrite_messages
-        result.messages = self._prepended_messages["ANY"] + result.messages
-        if result.value == TrinaryLogicValue(True):
-            result.messages = self._prepended_messages["SUCCESS"] + result.messages
-            for callback in self._on_success_callbacks:
-                callback(result)
-        if result.value == TrinaryLogicValue(False):
-            result.messages = self._prepended_messages["ERROR"] + result.messages
-            for callback in self._on_failure_callbacks:
-                callback(result)
-        if result.value == TrinaryLogicValue(None):
-            result.messages = self._prepended_messages["UNKNOWN"] + result.messages
-            for callback in self._on_unknown_callbacks:
-                callback(result)
-
-        result.messages += self._appended_messages["ANY"]
-        if result.value == TrinaryLogicValue(True):
-            result.messages += self._appended_messages["SUCCESS"]
-        if result.value == TrinaryLogicValue(False):
-            result.messages += self._appended_messages["ERROR"]
-        if result.value == TrinaryLogicValue(None):
-            result.messages += self._appended_messages["UNKNOWN"]
+            messages = self._overwrite_messages
+
+        # Slot 0 holds the messages of result type "ANY", see MESSAGE_SLOTS
+        status = self.STATUS_SLOTS[result.value.value]
+        result.messages = []
+        result.messages.extend(self._prepended_messages[status])
+        result.messages.extend(self._prepended_messages[0])
+        result.messages.extend(messages)
+
+        if status == self.MESSAGE_SLOTS["SUCCESS"]:
+            callbacks = self._on_success_callbacks
+        elif status == self.MESSAGE_SLOTS["ERROR"]:
+            callbacks = self._on_failure_callbacks
+        else:
+            callbacks = self._on_unknown_callbacks
+        for callback in callbacks:
+            callback(result)
+
+        result.messages.extend(self._appended_messages[0])
+        result.messages.extend(self._appended_messages[status])
         return result
 
     def prepend_message(self, result_type, message):
-        assert result_type in self._prepended_messages.keys()
+        assert result_type in self.MESSAGE_SLOTS
         if not isinstance(message, list):
             message = [message]
-        self._prepended_messages[result_type].extend(message)
+        self._prepended_messages[self.MESSAGE_SLOTS[result_type]].extend(message)
         return self
 
     def overwrite_check_message(self, message):
@@ -522,49 +657,23 @@ class Requirement(object):
         return self
 
     def append_message(self, result_type, message):
-        assert result_type in self._appended_messages.keys()
+        assert result_type in self.MESSAGE_SLOTS
         if not isinstance(message, list):
             message = [message]
-        self._appended_messages[result_type].extend(message)
+        self._appended_messages[self.MESSAGE_SLOTS[result_type]].extend(message)
         return self
 
     def __and__(self, rhs):
         # type: (Requirement) -> Requirement
-        def and_impl():
-            L = self.check()
-            R = rhs.check()
-            return RequirementCheckResult(L.value & R.value,
-                                          [],
-                                          [L, R],
-                                          is_and_node=True
-                                          )
-
-        return Requirement(and_impl)
+        return Requirement.combine(Requirement.AND, self, rhs)
 
     def __or__(self, rhs):
         # type: (Requirement) -> Requirement
-        def or_impl():
-            L = self.check()
-            R = rhs.check()
-            return RequirementCheckResult(L.value | R.value,
-                                          [],
-                                          [L, R],
-                                          is_or_node=True
-                                          )
-
-        return Requirement(or_impl)
+        return Requirement.combine(Requirement.OR, self, rhs)
 
     def __invert__(self):
-        # type: (Requirement) -> Requirement
-        def invert_impl():
-            L = self.check()
-            return RequirementCheckResult(~L.value,
-                                          [],
-                                          [L],
-                                          is_not_node=True
-                                          )
-
-        return Requirement(invert_impl)
+        # type: () -> Requirement
+        return Requirement.combine(Requirement.NOT, self)
 
     def on_success(self, callback):
         self._on_success_callbacks.append(callback)
@@ -598,30 +707,69 @@ class TexTextRequirementsChecker(object):
         self.pygtk_is_found = False
         self.tkinter_is_found = False
 
-        pass
+        # The PATH directories searched by find_executable with their listed entries and the
+        # result of the GUI library probe, reset by each call of check()
+        self._search_path = None
+        self._path_entry_cache = {}
+        self._gui_libraries = None
+        self._gui_libraries_future = None
+
+    def _probe_gui_libraries(self):
+        """
+        Checks for GTK3 and TkInter in a single Python subprocess
+
+        Returns a dict mapping "gtk3" and "tkinter" to True/ False, or to None if the probe
+        timed out before the library was reported. The result is reused until the next call
+        of check().
+        """
+        if self._gui_libraries is None:
+            if self._gui_libraries_future is not None:
+                self._gui_libraries = self._gui_libraries_future.result()
+            else:
+                self._gui_libraries = self._run_gui_libraries_probe()
+        return self._gui_libraries
+
+    def _run_gui_libraries_probe(self):
+        # TkInter is probed first and reported immediately so a crash while importing
+        # GTK3 does not hide it
+        probe_script = ("import sys\n"
+                        "try:\n"
+                        "    import tkinter, tkinter.messagebox, tkinter.filedialog\n"
+                        "    sys.stdout.write('textext-tkinter-ok\\n'); sys.stdout.flush()\n"
+                        "except Exception:\n"
+                        "    pass\n"
+                        "import gi\n"
+                        "gi.require_version('Gtk', '3.0')\n"
+                        "from gi.repository import Gtk, Gdk, GdkPixbuf\n"
+                        "sys.stdout.write('textext-gtk3-ok\\n')\n")
+        try:
+            stdout, _ = defaults.call_command([sys.executable, "-c", probe_script], return_code=None,
+                                              timeout=PROBE_TIMEOUT, capture_stderr=False)
+            # Each library is reported on a line of its own, so output of the imported
+            # modules cannot be mistaken for a report
+            lines = stdout.splitlines()
+            return {"gtk3": b"textext-gtk3-ok" in lines, "tkinter": b"textext-tkinter-ok" in lines}
+        except subprocess.TimeoutExpired as e:
+            # Usually the GTK3 import hangs, TkInter is found if it was reported before that
+            lines = (e.stdout or b"").splitlines()
+            return {"gtk3": None, "tkinter": True if b"textext-tkinter-ok" in lines else None}
+        except OSError:
+            return {"gtk3": False, "tkinter": False}
 
     def find_pygtk3(self):
-        try:
-            executable = sys.executable
-            defaults.call_command([executable, "-c", "import gi;"+
-                                                     "gi.require_version('Gtk', '3.0');"+
-                                                     "from gi.repository import Gtk, Gdk, GdkPixbuf"])
-        except (KeyError, OSError, subprocess.CalledProcessError):
+        found = self._probe_gui_libraries()["gtk3"]
+        if found is None:
+            return RequirementCheckResult(None, ["GTK3 probe timed out"])
+        if not found:
             return RequirementCheckResult(False, ["GTK3 is not found"])
         return RequirementCheckResult(True, ["GTK3 is found"])
 
     def find_tkinter(self):
-        executable = sys.executable
-        if sys.version_info[0] == 3:
-            import_tk_script = "import tkinter; import tkinter.messagebox; import tkinter.filedialog;"
-        else:
-            import_tk_script = "import Tkinter; import tkMessageBox; import tkFileDialog;"
-        try:
-            defaults.call_command(
-                [executable, "-c", import_tk_script])
-        except (KeyError, OSError, subprocess.CalledProcessError):
+        found = self._probe_gui_libraries()["tkinter"]
+        if found is None:
+            return RequirementCheckResult(None, ["TkInter probe timed out"])
+        if not found:
             return RequirementCheckResult(False, ["TkInter is not found"])
-
         return RequirementCheckResult(True, ["TkInter is found"])
 
     def find_inkscape_1_4(self):
@@ -633,12 +781,12 @@ class TexTextRequirementsChecker(object):
         except ImportError:
             try:
                 executable = self.find_executable('inkscape')['path']
-                stdout, stderr = defaults.call_command([executable, "--version"])
+                stdout, _ = defaults.call_command([executable, "--version"], capture_stderr=False)
                 stdout_line = stdout.decode("utf-8", 'ignore')
             except (KeyError, OSError):
                 return RequirementCheckResult(False, ["inkscape is not found"])
 
-        m = re.search(r"Inkscape ((\d+)\.(\d+)[-\w]*)", stdout_line)
+        m = INKSCAPE_VERSION_REGEX.search(stdout_line)
         if m:
             found_version, major, minor = m.groups()
             if int(major) >= 1 and int(minor) >= 4:
@@ -674,31 +822,57 @@ class TexTextRequirementsChecker(object):
 
     def _find_executable_in_path(self, prog_name):
         messages = []
+        if self._search_path is None:
+            self._search_path = defaults.get_system_path()
         for exe_name in defaults.executable_names[prog_name]:
-            first_path = None
-            for path in defaults.get_system_path():
-                full_path_guess = os.path.join(path, exe_name)
-                self.logger.log(VERBOSE, "Looking for `%s` in `%s`" % (exe_name, path))
-                if self.check_executable(full_path_guess):
-                    self.logger.log(VERBOSE, "`%s` is found at `%s`" % (exe_name, path))
+            if self.logger.isEnabledFor(VERBOSE):
+                self.logger.log(VERBOSE, "Looking for `%s` in PATH" % exe_name)
+            entry_name = os.path.normcase(exe_name)
+            for path in self._search_path:
+                executable_path = self._list_path_entries(path).get(entry_name)
+                if executable_path is not None and self.check_executable(executable_path):
                     messages.append("`%s` is found at `%s`" % (exe_name, path))
-                    if first_path is None:
-                        first_path = path
-            if first_path is not None:
-                return RequirementCheckResult(True, messages, path=os.path.join(first_path,exe_name))
+                    return RequirementCheckResult(True, messages, path=executable_path)
             messages.append("`%s` is NOT found in PATH" % (exe_name))
         return RequirementCheckResult(False, messages)
 
+    def _list_path_entries(self, path):
+        """
+        Returns a dict mapping the (case normalized) names of the entries of the directory
+        `path` to their full paths. Each directory is listed only once per check().
+        """
+        entries = self._path_entry_cache.get(path)
+        if entries is None:
+            try:
+                with os.scandir(path) as it:
+                    entries = {os.path.normcase(entry.name): entry.path for entry in it}
+            except OSError:
+                entries = {}
+            self._path_entry_cache[path] = entries
+        return entries
+
     def check_executable(self, filename):
-        return filename is not None and os.path.isfile(filename) and os.access(filename, os.X_OK)
+        # One stat call instead of os.path.isfile() followed by os.access()
+        if filename is None:
+            return False
+        try:
+            mode = os.stat(filename).st_mode
+        except (OSError, ValueError):
+            return False
+        return stat.S_ISREG(mode) and bool(mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH))
 
     def check(self):
+        self._search_path = None
+        self._path_entry_cache = {}
+        self._gui_libraries = None
 
-        def set_inkscape(exe):
-            self.inkscape_executable = exe
+        def set_inkscape(result):
+            self.inkscape_executable = result["path"]
 
-        def add_latex(name, exe):
-            self.available_tex_to_pdf_converters.update({name: exe})
+        def add_latex(name):
+            def add_converter(result):
+                self.available_tex_to_pdf_converters[name] = result["path"]
+            return add_converter
 
         def set_pygtk(result):
             self.pygtk_is_found = True
@@ -737,38 +911,44 @@ class TexTextRequirementsChecker(object):
             Requirement(self.find_inkscape_1_4)
             .prepend_message("ANY", 'Detect inkscape >= 1.3')
             .append_message("ERROR", help_message_with_url("preparation","inkscape"))
-            .on_success(lambda result: set_inkscape(result["path"]))
+            .on_success(set_inkscape)
             & (
                     Requirement(self.find_executable, self.pdflatex_prog_name)
-                    .on_success(lambda result: add_latex("pdflatex", result["path"]))
+                    .on_success(add_latex("pdflatex"))
                     .append_message("ERROR", help_message_with_url("preparation", "pdflatex"))
                     | Requirement(self.find_executable, self.lualatex_prog_name)
-                    .on_success(lambda result: add_latex("lualatex", result["path"]))
+                    .on_success(add_latex("lualatex"))
                     .append_message("ERROR", help_message_with_url("preparation", "lualatex"))
                     | Requirement(self.find_executable, self.xelatex_prog_name)
-                    .on_success(lambda result: add_latex("xelatex", result["path"]))
+                    .on_success(add_latex("xelatex"))
                     .append_message("ERROR", help_message_with_url("preparation", "xelatex"))
                     | Requirement(self.find_executable, self.typst_prog_name)
-                    .on_success(lambda result: add_latex("typst", result["path"]))
+                    .on_success(add_latex("typst"))
                     .append_message("ERROR", help_message_with_url("preparation", "typst"))
-            ).overwrite_check_message("Detect *latex")
+            )
+            .overwrite_check_message("Detect *latex")
             .append_message("ERROR", help_message_with_url("preparation"))
             & (
                     Requirement(self.find_pygtk3).on_success(set_pygtk)
                     .append_message("ERROR", help_message_with_url("gtk3"))
                     | Requirement(self.find_tkinter).on_success(set_tkinter)
                     .append_message("ERROR", help_message_with_url("tkinter"))
-            ).overwrite_check_message("Detect GUI library")
+            )
+            .overwrite_check_message("Detect GUI library")
             .append_message("ERROR", help_message_with_url("gui-library"))
         ).overwrite_check_message("TexText requirements")
 
-        check_result = textext_requirements.check()
-
-        check_result = check_result.flatten()
-
-        check_result.mark_critical_errors()
+        # The GUI library probe spawns a Python interpreter, so it runs in the background
+        # while inkscape and the latex executables are checked.
+        # Results of combined requirements are already flat, see Requirement.check
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            self._gui_libraries_future = executor.submit(self._run_gui_libraries_probe)
+            try:
+                check_result = textext_requirements.check()
+            finally:
+                self._gui_libraries_future = None
 
-        check_result.print_to_logger(self.logger)
+        check_result.print_to_logger(self.logger, non_critical_value=True)
 
         return check_result.value
 
@@ -785,3 +965,8 @@ else:
 VERBOSE = 5
 SUCCESS = 41
 UNKNOWN = 42
+
+# Max. time in seconds an import probe may take before it is reported as unknown
+PROBE_TIMEOUT = 5
+
+INKSCAPE_VERSION_REGEX = re.compile(r"Inkscape ((\d+)\.(\d+)[-\w]*)")
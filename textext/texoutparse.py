@@ -32,51 +32,55 @@ END OF LICENSE
 Adapted to be compatible with Python 2.7 by TexText developers
 """
 import re
-from collections import deque
 
 
-class LogFileMessage(object):
+class LogFileMessage(dict):
     """
     Helper class for storing log file messages.
 
     Messages and attributes of the messages can be accessed and added using
     the item notation.
     """
+    __slots__ = ('context_lines',)
 
-    def __init__(self):
-        self.info = {}
+    def __init__(self, **info):
+        super(LogFileMessage, self).__init__(info)
         self.context_lines = []
 
     def __str__(self):
         return '\n'.join(self.context_lines)
 
-    def __getitem__(self, item):
-        try:
-            return self.info[item]
-        except KeyError:
-            raise KeyError('Item {item} was not found.', format(item=item))
-
-    def __setitem__(self, key, value):
-        self.info[key] = value
+    @property
+    def info(self):
+        """The attributes of the message, kept for compatibility"""
+        return self
 
 
 class _LineIterWrapper(object):
     """
     Wrapper around an iterable that allows peeking ahead to get context lines
     without consuming the iterator.
+
+    Lines read ahead are kept in a ring buffer of ctx_lines + 1 slots, holding
+    `pending` lines starting at index `head`.
     """
 
     def __init__(self, iterable, ctx_lines):
         self.iterable = iter(iterable)
-        self.cache = deque()
+        self.cache = [None] * (ctx_lines + 1)
+        self.head = 0
+        self.pending = 0
         self.ctx_lines = ctx_lines
         self.current = None
 
     def __next__(self):
-        if self.cache:
-            self.current = current = self.cache.popleft()
+        if self.pending:
+            current = self.cache[self.head]
+            self.head = (self.head + 1) % len(self.cache)
+            self.pending -= 1
         else:
-            self.current = current = next(self.iterable)
+            current = next(self.iterable)
+        self.current = current
         return current
 
     def next(self):
@@ -87,13 +91,21 @@ class _LineIterWrapper(object):
 
     def get_context(self):
         rv = [self.current] if self.current else []
-        for _ in range(self.ctx_lines + 1 - len(rv)):
+        wanted = self.ctx_lines + 1 - len(rv)
+        size = len(self.cache)
+
+        # Lines which have been read ahead already come first
+        for i in range(min(self.pending, wanted)):
+            rv.append(self.cache[(self.head + i) % size])
+
+        while self.pending < wanted:
             try:
                 next_val = next(self.iterable)
-                self.cache.append(next_val)
-                rv.append(next_val)
             except StopIteration:
                 break
+            self.cache[(self.head + self.pending) % size] = next_val
+            self.pending += 1
+            rv.append(next_val)
         return rv
 
 
@@ -107,28 +119,56 @@ class LatexLogParser(object):
     list.
     """
 
-    error = re.compile(
-            r"^(?:! ((?:La|pdf)TeX|Package|Class)(?: (\w+))? [eE]rror(?: \(([\\]?\w+)\))?: (.*)|! (.*))"
+    # The patterns use named groups which are unique over all patterns, so the
+    # processors can read the groups from matches of the single patterns as
+    # well as from matches of the combined pattern below.
+    _error_pattern = (
+            r"^(?:! (?P<err_type>(?:La|pdf)TeX|Package|Class)(?: (?P<err_name>\w+))? [eE]rror"
+            r"(?: \((?P<err_extra>[\\]?\w+)\))?: (?P<err_message>.*)|! (?P<err_tex_message>.*))"
             )
-    warning = re.compile(
-            r"^((?:La|pdf)TeX|Package|Class)(?: (\w+))? [wW]arning(?: \(([\\]?\w+)\))?: (.*)"
+    _warning_pattern = (
+            r"^(?P<warn_type>(?:La|pdf)TeX|Package|Class)(?: (?P<warn_name>\w+))? [wW]arning"
+            r"(?: \((?P<warn_extra>[\\]?\w+)\))?: (?P<warn_message>.*)"
             )
-
-    info = re.compile(
-            r"^((?:La|pdf)TeX|Package|Class)(?: (\w+))? [iI]nfo(?: \(([\\]?\w+)\))?: (.*)"
+    _info_pattern = (
+            r"^(?P<info_type>(?:La|pdf)TeX|Package|Class)(?: (?P<info_name>\w+))? [iI]nfo"
+            r"(?: \((?P<info_extra>[\\]?\w+)\))?: (?P<info_message>.*)"
             )
-    badbox = re.compile(
-            r"^(Over|Under)full "
-            r"\\([hv])box "
-            r"\((?:badness (\d+)|(\d+(?:\.\d+)?pt) too \w+)\) (?:"
+    _badbox_pattern = (
+            r"^(?P<bbox_type>Over|Under)full "
+            r"\\(?P<bbox_direction>[hv])box "
+            r"\((?:badness (?P<bbox_badness>\d+)|(?P<bbox_size>\d+(?:\.\d+)?pt) too \w+)\) (?:"
             r"(?:(?:in paragraph|in alignment|detected) "
-            r"(?:at lines (\d+)--(\d+)|at line (\d+)))"
-            r"|(?:has occurred while [\\]output is active [\[](\d+)?[\]]))"
+            r"(?:at lines (?P<bbox_start>\d+)--(?P<bbox_end>\d+)|at line (?P<bbox_line>\d+)))"
+            r"|(?:has occurred while [\\]output is active [\[](?P<bbox_page>\d+)?[\]]))"
             )
-    missing_ref = re.compile(
-        r"^LaTeX Warning: (Citation|Reference) `([^']+)' on page (\d+) undefined on input line (\d+)\."
+    _missing_ref_message_pattern = (
+        r"(?P<mref_type>Citation|Reference) `(?P<mref_key>[^']+)' on page (?P<mref_page>\d+) "
+        r"undefined on input line (?P<mref_line>\d+)\."
+    )
+    _missing_ref_pattern = r"^LaTeX Warning: " + _missing_ref_message_pattern
+
+    error = re.compile(_error_pattern)
+    warning = re.compile(_warning_pattern)
+    info = re.compile(_info_pattern)
+    badbox = re.compile(_badbox_pattern)
+    missing_ref = re.compile(_missing_ref_pattern)
+    _missing_ref_message = re.compile(_missing_ref_message_pattern)
+
+    # All patterns checked by process_line in one alternation, in the order of
+    # precedence. The name of the matching alternative selects the processor.
+    # Missing refs are LaTeX warnings, process_warning tells them apart.
+    _combined = re.compile(
+        "(?P<badbox>" + _badbox_pattern + ")"
+        "|(?P<warning>" + _warning_pattern + ")"
+        "|(?P<error>" + _error_pattern + ")"
     )
 
+    __slots__ = ('warnings', 'errors', 'badboxes', 'missing_refs', 'context_lines')
+
+    # Every line matched by one of the patterns starts with one of these prefixes
+    _prefixes = ("!", "Over", "Under", "LaTeX", "pdfTeX", "Package", "Class")
+
     def __init__(self, context_lines=2):
         self.warnings = []
         self.errors = []
@@ -151,49 +191,62 @@ class LatexLogParser(object):
         """
         lines_iterable = _LineIterWrapper(lines, self.context_lines)
 
-        # cache the line processor for speed
-        process_line = self.process_line
-
-        for _, line in enumerate(lines_iterable):
-            if not line:
+        # Same as process_line, inlined and with everything cached for speed
+        prefixes = self._prefixes
+        match_line = self._combined.match
+        processors = {
+            "badbox": self.process_badbox,
+            "warning": self.process_warning,
+            "error": self.process_error,
+        }
+
+        for line in lines_iterable:
+            # empty lines are skipped as well
+            if not line.startswith(prefixes):
                 continue
-            err = process_line(line)
-            if err is not None:
-                err.context_lines = lines_iterable.get_context()
+            match = match_line(line)
+            if match is None:
+                continue
+            err = processors[match.lastgroup](match)
+            err.context_lines = lines_iterable.get_context()
+
+    def process_file(self, path, encoding="utf8"):
+        """
+        Process a log file, streaming its lines through process.
+
+        :param path: Path of the log file.
+        :param encoding: Encoding of the log file, undecodable bytes are replaced.
+        """
+        with open(path, encoding=encoding, errors="replace", buffering=1 << 20) as f:
+            self.process(f)
 
     def process_line(self, line):
         """
         Process a line in the log file and delegate to correct handler.
 
-        Tests in turn matches to the badbox regex, warning regex, and
-        then error regex. Once a match is found, the corresponding
-        process function is called its result returned.
+        Matches the line against the combined pattern of badboxes, warnings
+        (including missing refs) and errors (in this order of precedence).
+        If a match is found, the corresponding process function is called
+        its result returned.
 
         :param line: Line to process
         :returns: LogFileMessage object or None
         """
+        # Most lines are plain typesetting output, skip them before running
+        # the regex engine
+        if not line.startswith(self._prefixes):
+            return None
 
-        # Missings refs are very common, try those first
-        match = self.missing_ref.match(line)
-        if match is not None:
-            return self.process_missing_ref(match)
+        match = self._combined.match(line)
+        if match is None:
+            return None
 
-        # Badboxes are next most common, so match those first
-        match = self.badbox.match(line)
-        if match is not None:
+        kind = match.lastgroup
+        if kind == "badbox":
             return self.process_badbox(match)
-
-        # Now try warnings
-        match = self.warning.match(line)
-        if match is not None:
+        if kind == "warning":
             return self.process_warning(match)
-
-        # Now try errors
-        match = self.error.match(line)
-        if match is not None:
-            return self.process_error(match)
-
-        return None
+        return self.process_error(match)
 
     def process_badbox(self, match):
         """
@@ -202,29 +255,27 @@ class LatexLogParser(object):
         :param match: regex match object to process
         :return: LogFileMessage object
         """
+        g = match.group
 
         # Regex match groups
-        # 0 - Whole match (line)
-        # 1 - Type (Over|Under)
-        # 2 - Direction ([hv])
-        # 3 - Underfull box badness (badness (\d+))
-        # 4 - Overfull box over size (\d+(\.\d+)?pt too \w+)
-        # 5 - Multi-line start line (at lines (\d+)--)
-        # 6 - Multi-line end line (--(d+))
-        # 7 - Single line (at line (\d+))
-
-        message = LogFileMessage()
-        message['type'] = match.group(1)
-        message['direction'] = match.group(2)
-
-        # direction is either h or v
-        message['by'] = match.group(3) or match.group(4)
+        # bbox_type - Type (Over|Under)
+        # bbox_direction - Direction ([hv])
+        # bbox_badness - Underfull box badness (badness (\d+))
+        # bbox_size - Overfull box over size (\d+(\.\d+)?pt too \w+)
+        # bbox_start - Multi-line start line (at lines (\d+)--)
+        # bbox_end - Multi-line end line (--(d+))
+        # bbox_line - Single line (at line (\d+))
 
         # single or multi-line
-        if match.group(7) is not None:
-            message['lines'] = (match.group(7), match.group(7))
+        line = g('bbox_line')
+        if line is not None:
+            lines = (line, line)
         else:
-            message['lines'] = (match.group(5), match.group(6))
+            lines = (g('bbox_start'), g('bbox_end'))
+
+        # direction is either h or v
+        message = LogFileMessage(type=g('bbox_type'), direction=g('bbox_direction'),
+                                 by=g('bbox_badness') or g('bbox_size'), lines=lines)
 
         self.badboxes.append(message)
         return message
@@ -236,32 +287,22 @@ class LatexLogParser(object):
         :param match: regex match object to process
         :return: LogFileMessage object
         """
+        g = match.group
 
         # Regex match groups
-        # 0 - Whole match (line)
-        # 1 - Type ((?:La|pdf)TeX|Package|Class)
-        # 2 - Package or Class name (\w*)
-        # 3 - extra
-        # 4 - Warning message (.*)
-
-        message = LogFileMessage()
-        message['type'] = type_ = match.group(1)
-
-        if type_ == 'Package':
-            # package name should be group 2
-            message['package'] = match.group(2)
-        elif type_ == 'Class':
-            # class should be group 2
-            message['class'] = match.group(2)
-        elif match.group(2) is not None:
-            # In any other case we want to record the component responsible for
-            # the warning, if one is present.
-            message['component'] = match.group(2)
-
-        if match.group(3) is not None:
-            message['extra'] = match.group(3)
-
-        message['message'] = match.group(4)
+        # warn_type - Type ((?:La|pdf)TeX|Package|Class)
+        # warn_name - Package or Class name (\w*)
+        # warn_extra - extra
+        # warn_message - Warning message (.*)
+
+        # Missing refs are very common, they are recognized by the message of
+        # a plain LaTeX warning without matching the whole line a second time
+        if match.string.startswith("LaTeX Warning: "):
+            missing_ref_match = self._missing_ref_message.match(g('warn_message'))
+            if missing_ref_match is not None:
+                return self.process_missing_ref(missing_ref_match)
+
+        message = self._typed_message(g('warn_type'), g('warn_name'), g('warn_extra'), g('warn_message'))
         self.warnings.append(message)
         return message
 
@@ -272,34 +313,19 @@ class LatexLogParser(object):
         :param match: regex match object to process
         :return: LogFileMessage object
         """
+        g = match.group
 
         # Regex match groups
-        # 0 - Whole match (line)
-        # 1 - Type (LaTeX|Package|Class)
-        # 2 - Package or Class (\w+)
-        # 3 - extra (\(([\\]\w+)\))
-        # 4 - Error message for typed error (.*)
-        # 5 - TeX error message (.*)
-
-        message = LogFileMessage()
-        if match.group(1) is not None:
-            message['type'] = type_ = match.group(1)
-
-            if type_ == 'Package':
-                # Package name should be group 2
-                message['package'] = match.group(2)
-            elif type_ == 'Class':
-                # Class name should be group 2
-                message['class'] = match.group(2)
-            elif match.group(2) is not None:
-                message['component'] = match.group(2)
-
-            if match.group(3) is not None:
-                message['extra'] = match.group(3)
-
-            message['message'] = match.group(4)
+        # err_type - Type (LaTeX|Package|Class)
+        # err_name - Package or Class (\w+)
+        # err_extra - extra (\(([\\]\w+)\))
+        # err_message - Error message for typed error (.*)
+        # err_tex_message - TeX error message (.*)
+
+        if g('err_type') is not None:
+            message = self._typed_message(g('err_type'), g('err_name'), g('err_extra'), g('err_message'))
         else:
-            message['message'] = match.group(5)
+            message = LogFileMessage(message=g('err_tex_message'))
 
         self.errors.append(message)
         return message
@@ -311,11 +337,38 @@ class LatexLogParser(object):
         :param match: regex match object to process
         :return: LogFileMessage object.
         """
-        message = LogFileMessage()
-        message["type"] = "Missing {grp}".format(grp=match.group(1))
-        message["key"] = match.group(2)
-        message["page"] = match.group(3)
-        message["line"] = match.group(4)
+        g = match.group
+        message = LogFileMessage(type="Missing " + g('mref_type'), key=g('mref_key'),
+                                 page=g('mref_page'), line=g('mref_line'))
 
         self.missing_refs.append(message)
         return message
+
+    @staticmethod
+    def _typed_message(type_, name, extra, text):
+        """
+        Create the log message object of a typed (LaTeX, pdfTeX, Package or
+        Class) warning or error.
+
+        :param type_: Type of the message
+        :param name: Package, Class or component name, if any
+        :param extra: extra, if any
+        :param text: The message
+        :return: LogFileMessage object
+        """
+        if type_ == 'Package':
+            info = {'type': type_, 'package': name}
+        elif type_ == 'Class':
+            info = {'type': type_, 'class': name}
+        elif name is not None:
+            # In any other case we want to record the component responsible for
+            # the message, if one is present.
+            info = {'type': type_, 'component': name}
+        else:
+            info = {'type': type_}
+
+        if extra is not None:
+            info['extra'] = extra
+
+        info['message'] = text
+        return LogFileMessage(**info)
@@ -11,13 +11,12 @@ for full license details.
 Provides handlers for temp-dir management, logging, settings and
 system command execution
 """
+import collections
 import contextlib
 import json
 import logging.handlers
 import os
 import platform
-import shutil
-import stat
 import subprocess
 import tempfile
 import re
@@ -29,7 +28,7 @@ import sys
 class ChangeDirectory(object):
     def __init__(self, dir):
         self.new_dir = dir
-        self.old_dir = os.path.abspath(os.path.curdir)
+        self.old_dir = os.getcwd()
 
     def __enter__(self):
         os.chdir(self.new_dir)
@@ -38,28 +37,10 @@ class ChangeDirectory(object):
         os.chdir(self.old_dir)
 
 
-class TemporaryDirectory(object):
-    """ Mimic tempfile.TemporaryDirectory from python3 """
-    def __init__(self):
-        self.dir_name = None
-
-    def __enter__(self):
-        self.dir_name = tempfile.mkdtemp("textext_")
-        return self.dir_name
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-
-        def retry_with_chmod(func, path, exec_info):
-            os.chmod(path, stat.S_IWRITE)
-            func(path)
-
-        if self.dir_name:
-            shutil.rmtree(self.dir_name, onerror=retry_with_chmod)
-
-
 @contextlib.contextmanager
 def ChangeToTemporaryDirectory():
-    with TemporaryDirectory() as temp_dir:
+    # Read-only files left in the directory are removed by TemporaryDirectory as well
+    with tempfile.TemporaryDirectory("textext_") as temp_dir:
         with ChangeDirectory(temp_dir):
             yield None
 
@@ -68,36 +49,37 @@ class MyLogger(logging.Logger):
     """
         Needs to produce correct line numbers
     """
+    # Frames of these modules are never reported as the caller
+    _skipped_modules = frozenset(["logging", __name__])
+
     def findCaller(self, *args):
-        n_frames_upper = 2
-        f = logging.currentframe()
-        for _ in range(2 + n_frames_upper):  # <-- correct frame
-            if f is not None:
-                f = f.f_back
-        rv = "(unknown file)", 0, "(unknown function)", None
-        while hasattr(f, "f_code"):
-            co = f.f_code
-            filename = os.path.normcase(co.co_filename)
-            if filename == logging._srcfile:
-                f = f.f_back
-                continue
-            rv = (co.co_filename, f.f_lineno, co.co_name, None)
-            break
-        if sys.version_info[0] == 2:  # ToDo: Remove when Python 2 support is deprecated
-            rv = rv[0:3]
-        return rv
+        # Skip findCaller, Logger._log and the Logger method called, then the
+        # remaining frames of logging and NestedLoggingGuard
+        f = sys._getframe(3)
+        while f is not None and f.f_globals.get("__name__") in self._skipped_modules:
+            f = f.f_back
+        if f is None:
+            return "(unknown file)", 0, "(unknown function)", None
+        co = f.f_code
+        return co.co_filename, f.f_lineno, co.co_name, None
 
 
 class NestedLoggingGuard(object):
     message_offset = 0
     message_indent = 2
+    # Indentation strings by message_offset, deeper nesting falls back to " " * offset
+    _indents = tuple(" " * i for i in range(64))
+    _max_indent = len(_indents)
 
     def __init__(self, _logger, lvl=None, message=None):
         self._logger = _logger
         self._level = lvl
         self._message = message
-        if lvl is not None and message is not None:
-            self._logger.log(self._level, " " * NestedLoggingGuard.message_offset + self._message)
+        # The indented message is only built if it is going to be logged
+        if lvl is not None and message is not None and self._logger.isEnabledFor(lvl):
+            offset = NestedLoggingGuard.message_offset
+            indent = self._indents[offset] if offset < self._max_indent else " " * offset
+            self._logger.log(self._level, indent + self._message)
 
     def __enter__(self):
         assert self._level is not None
@@ -112,12 +94,10 @@ class NestedLoggingGuard(object):
         else:
             result = "failed"
         NestedLoggingGuard.message_offset -= NestedLoggingGuard.message_indent
-
-        def tmp1():  # this nesting needed to even number of stack frames in __enter__ and __exit__
-            def tmp2():
-                self._logger.log(self._level, " " * NestedLoggingGuard.message_offset + self._message.strip() + " " + result)
-            tmp2()
-        tmp1()
+        if self._logger.isEnabledFor(self._level):
+            offset = NestedLoggingGuard.message_offset
+            indent = self._indents[offset] if offset < self._max_indent else " " * offset
+            self._logger.log(self._level, indent + self._message.strip() + " " + result)
 
     def debug(self, message):
         return self.log(logging.DEBUG, message)
@@ -137,26 +117,31 @@ class NestedLoggingGuard(object):
     def log(self, lvl, message):
         return NestedLoggingGuard(self._logger, lvl, message)
 
+    def isEnabledFor(self, lvl):
+        return self._logger.isEnabledFor(lvl)
+
 
 class CycleBufferHandler(logging.handlers.BufferingHandler):
 
     def __init__(self, capacity):
         super(CycleBufferHandler, self).__init__(capacity)
+        # The oldest records are dropped by the deque itself
+        self.buffer = collections.deque(maxlen=capacity)
 
     def emit(self, record):
         self.buffer.append(record)
-        if len(self.buffer) > self.capacity:
-            self.buffer = self.buffer[-self.capacity:]
+
+    def flush(self):
+        # BufferingHandler.flush of older Pythons replaces the buffer by a plain list
+        self.acquire()
+        try:
+            self.buffer.clear()
+        finally:
+            self.release()
 
     def show_messages(self):
-        import sys
-        version_is_good = (2, 7) <= sys.version_info < (3, 0)
-        if version_is_good:
-            import inkex
-            """show messages to user and empty buffer"""
-            inkex.errormsg("\n".join([self.format(record) for record in self.buffer]))
-        else:
-            sys.stderr.write("\n".join([self.format(record) for record in self.buffer]))
+        """show messages to user and empty buffer"""
+        sys.stderr.write("\n".join([self.format(record) for record in self.buffer]))
         self.flush()
 
 
@@ -168,6 +153,7 @@ class Settings(object):
             if not os.path.exists(directory):
                 os.makedirs(directory, exist_ok=True)
         self.values = {}
+        self._saved_text = None
         self.directory = directory
         self.config_path = os.path.join(directory, basename)
         try:
@@ -179,10 +165,16 @@ class Settings(object):
         if os.path.isfile(self.config_path):
             with open(self.config_path) as f:
                 self.values = json.load(f)
+            self._saved_text = json.dumps(self.values, indent=2)
 
     def save(self):
+        text = json.dumps(self.values, indent=2)
+        # The file is only rewritten if the values have changed since they were loaded or saved
+        if text == self._saved_text and os.path.isfile(self.config_path):
+            return
         with open(self.config_path, "w") as f:
-            json.dump(self.values, f, indent=2)
+            f.write(text)
+        self._saved_text = text
 
     def get(self, key, default=None):
         result = self.values.get(key, default)
@@ -241,35 +233,29 @@ class SuppressStream(object):
 def exec_command(cmd, ok_return_value=0):
     """
     Run given command, check return value, and return
-    concatenated stdout and stderr.
+    stdout and stderr.
     :param cmd: Command to execute
     :param ok_return_value: The expected return value after successful completion
+    :returns: Tuple (stdout, stderr) of bytes
     :raises: TexTextCommandNotFound, TexTextCommandFailed
     """
 
     try:
-        # hides the command window for cli tools that are run (in Windows)
-        info = None
-        if PLATFORM == WINDOWS:
-            info = subprocess.STARTUPINFO()
-            info.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            info.wShowWindow = subprocess.SW_HIDE
-
-        p = subprocess.Popen(cmd,
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE,
-                             stdin=subprocess.PIPE,
-                             startupinfo=info)
-        out, err = p.communicate()
+        # The output is kept completely, it is reported to the user if the command fails
+        p = subprocess.run(cmd,
+                           stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE,
+                           stdin=subprocess.DEVNULL,
+                           startupinfo=_STARTUPINFO)
     except OSError as err:
         raise TexTextCommandNotFound("Command %s failed: %s" % (' '.join(cmd), err))
 
     if ok_return_value is not None and p.returncode != ok_return_value:
         raise TexTextCommandFailed(message="Command %s failed (code %d)" % (' '.join(cmd), p.returncode),
                                    return_code=p.returncode,
-                                   stdout=out,
-                                   stderr=err)
-    return out + err
+                                   stdout=p.stdout,
+                                   stderr=p.stderr)
+    return p.stdout, p.stderr
 
 
 def version_greater_or_equal_than(version_str, other_version_str):
@@ -292,7 +278,7 @@ def version_greater_or_equal_than(version_str, other_version_str):
         If conversion fails returns NaN.
 
         """
-        m = re.search(r"(\d+).(\d+).(\d+)[-\w]*", ver_str)
+        m = VERSION_REGEX.search(ver_str)
         if m is not None:
             ver_maj, ver_min, ver_rel = m.groups()
             return float("{}.{:0>3}{:0>3}".format(ver_maj, ver_min, ver_rel))
@@ -302,6 +288,16 @@ def version_greater_or_equal_than(version_str, other_version_str):
     return ver_str_to_float(version_str) >= ver_str_to_float(other_version_str)
 
 
+VERSION_REGEX = re.compile(r"(\d+)\.(\d+)\.(\d+)[-\w]*")
+
 MAC = "Darwin"
 WINDOWS = "Windows"
-PLATFORM = platform.system()
\ No newline at end of file
+PLATFORM = platform.system()
+
+# hides the command window for cli tools that are run (in Windows),
+# Popen works on a copy of it so it is shared by all calls
+_STARTUPINFO = None
+if PLATFORM == WINDOWS:
+    _STARTUPINFO = subprocess.STARTUPINFO()
+    _STARTUPINFO.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    _STARTUPINFO.wShowWindow = subprocess.SW_HIDE
@@ -12,7 +12,7 @@ Provides a crude mechanism trying to determine the install dir of inkscape
 on Windows machines
 """
 import os as _os
-import subprocess as _sp
+import shutil as _sh
 import winreg as _wr
 
 # Windows Registry key under which the installation dir of Inkscape is stored
@@ -23,21 +23,12 @@ INKSCAPE_REG_KEY_MSI = r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths\ink
 
 def check_cmd_in_syspath(command_name):
     """
-    Checks if command_name can be executed without throwing FileNotFoundError.
-    If the command could be executed True is returned, otherwise False.
+    Checks if command_name can be found in the system path (including the
+    extensions in PATHEXT). If so True is returned, otherwise False.
 
     (Currently not used, but might be useful in the future...)
     """
-    try:
-        info = _sp.STARTUPINFO()
-        info.dwFlags |= _sp.STARTF_USESHOWWINDOW
-        info.wShowWindow = _sp.SW_HIDE
-
-        proc = _sp.Popen([command_name, "--help"], stdout=_sp.PIPE, stderr=_sp.PIPE, stdin=_sp.PIPE, startupinfo=info)
-        _, _ = proc.communicate()
-        return True
-    except WindowsError as excpt:
-        return False
+    return _sh.which(command_name) is not None
 
 
 def get_non_syspath_dirs():